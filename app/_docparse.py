@@ -0,0 +1,104 @@
+"""
+Pure-Python text assembly for DocumentService: raw PDF text -> paragraphs -> laws.
+
+Kept free of third-party imports and fully annotated so it can be compiled
+with mypyc (`python -m mypyc app/_docparse.py`); the compiled extension then
+shadows this file on import. Without it, this module runs as plain Python.
+"""
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+# lines that clearly start a new bullet / section
+# e.g. "10.", "10.1.", "10.1.1. Some text"
+_NEW_BLOCK_RE = re.compile(r"^(\d+(?:\.\d+)*\.)(?:\s+(.*))?$")
+# law id, e.g. "10."; the paragraph after it is the law name, e.g. "Watch"
+_LAW_ID_RE = re.compile(r"^(\d+)\.\s*$")
+# subsection marker with optional text, e.g. "10.1." or "10.1. Some text"
+_SUBSECTION_RE = re.compile(r"^(\d+(?:\.\d+)+\.)\s*(.*)$")
+
+
+def iter_paragraphs(raw_text: str) -> Iterator[str]:
+    """Yield paragraphs from raw text in a single pass, splitting out section markers."""
+    buffer: List[str] = []
+
+    for ln in raw_text.splitlines():
+        ln = ln.strip()
+        if not ln:
+            if buffer:
+                yield " ".join(buffer)
+                buffer.clear()
+            continue
+
+        m_block = _NEW_BLOCK_RE.match(ln)
+        if m_block:
+            # split the marker like "10.1." into its own paragraph,
+            # the text after it starts the next one
+            if buffer:
+                yield " ".join(buffer)
+                buffer.clear()
+            yield m_block.group(1)
+            if m_block.group(2):
+                buffer.append(m_block.group(2))
+        else:
+            buffer.append(ln)
+
+    if buffer:
+        yield " ".join(buffer)
+
+
+def assemble_laws(paragraphs: Iterable[str]) -> Iterator[Tuple[str, str, str]]:
+    """Yield (law_id, law_name, text) for each law as soon as it has been read."""
+    current_law_id: str | None = None
+    current_law_name: str | None = None
+    current_paras: List[str] = []
+    expecting_name = False
+
+    for para in paragraphs:
+        m_id = _LAW_ID_RE.match(para)
+        if m_id:
+            if current_law_id and current_law_name and current_paras:
+                yield current_law_id, current_law_name, format_law(current_paras)
+            current_law_id = m_id.group(1)
+            current_law_name = None
+            current_paras = []
+            expecting_name = True
+            continue
+
+        if expecting_name:
+            name = para.strip()
+            if name:
+                current_law_name = name
+                expecting_name = False
+            continue
+
+        if current_law_id is not None:
+            current_paras.append(para)
+
+    if current_law_id and current_law_name and current_paras:
+        yield current_law_id, current_law_name, format_law(current_paras)
+
+
+def format_law(law_paras: List[str]) -> str:
+    """Join a law's paragraphs into its text, indenting subsections by depth."""
+    # Subsection headers and the continuation paragraphs that follow them all end
+    # up space-separated, so collect the pieces and join once at the end rather
+    # than growing the last line by repeated concatenation (quadratic).
+    pieces: List[str] = []
+
+    for para in law_paras:
+        # subsection marker on its own line (from iter_paragraphs)
+        m_sub = _SUBSECTION_RE.match(para)
+        if m_sub:
+            number = m_sub.group(1).rstrip(".")
+            rest = m_sub.group(2).strip()
+
+            depth = number.count(".") + 1
+            indent = "  " * (depth - 1)
+            if rest:
+                pieces.append(f"{indent}{number}. {rest}")
+            else:
+                pieces.append(f"{indent}{number}.")
+        else:
+            pieces.append(para)
+
+    return " ".join(pieces).strip()
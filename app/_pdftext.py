@@ -0,0 +1,18 @@
+"""
+PDF page-range text extraction for DocumentService's worker processes.
+
+Kept in its own module with no imports beyond pypdfium2, so worker processes
+started with forkserver/spawn don't pay for importing app.utils (and with it
+llama_index) just to unpickle the task.
+"""
+import pypdfium2 as pdfium
+
+
+def extract_pages_text(pdf_bytes: bytes, pages: range) -> str:
+    """Extract text from a range of pages. Runs in worker processes, so it
+    opens its own PdfDocument (PDFium is not thread-safe)."""
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        return "\n".join(pdf[i].get_textpage().get_text_range() for i in pages)
+    finally:
+        pdf.close()
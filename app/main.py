@@ -1,48 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from app.utils import Output, DocumentService, QdrantService
+from app.utils import Output, DocumentService, QdrantService, open_http_client, aclose_http_client
+import asyncio
 import os
 
-app = FastAPI(title="Westeros Legal Assistant")
-
-# Allow CORS during local development so the Next.js frontend can call this API.
-# In production, restrict origins appropriately.
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Global instances
 qdrant_service = QdrantService(k=3)
-IS_READY = False # Flag to track successful startup
 
-@app.on_event("startup")
-def startup_event():
-    global IS_READY
+
+async def startup_event() -> bool:
+    """Connects to Qdrant and indexes the PDF if needed. Returns True on success."""
     print("--- STARTUP: Initializing Vector Store ---")
 
     if not os.environ.get('OPENAI_API_KEY'):
         print("FATAL: OPENAI_API_KEY environment variable not set.")
-        return
+        return False
 
+    ready = False
     try:
         # NOTE: Using the path where the Dockerfile copies the PDF
         doc_service = DocumentService()
         
-        # 1. Connect and initialize the empty index
-        qdrant_service.connect()
+        # 1. Connect and initialize the index (persisted collections are reused),
+        #    reading and hashing the PDF in a worker thread meanwhile
+        fingerprint, _ = await asyncio.gather(
+            asyncio.to_thread(doc_service.fingerprint),
+            qdrant_service.aconnect(),
+        )
         print("STATUS: Qdrant Client connected.")
         
-        # 2. Load and index the documents
-        docs = doc_service.create_documents()
-        print(f"STATUS: Parsed {len(docs)} sections from PDF.")
-
-        qdrant_service.load(docs)
-        print("STATUS: Documents successfully indexed and loaded into Qdrant.")
-        IS_READY = True
+        # 2. Load and index the documents, unless the stored index matches the PDF
+        if qdrant_service.is_fresh(fingerprint):
+            print("STATUS: Existing Qdrant collection matches the PDF; skipping indexing.")
+        else:
+            qdrant_service.reset()
+            # Sections are parsed lazily and indexed in batches as they stream in
+            docs = doc_service.create_documents()
+            n_docs = await qdrant_service.aload(docs)
+            qdrant_service.mark_fresh(fingerprint)
+            print(f"STATUS: {n_docs} sections from PDF successfully indexed and loaded into Qdrant.")
+        ready = True
         
     except FileNotFoundError as e:
         print(f"FATAL ERROR (File): {e}")
@@ -50,15 +48,42 @@ def startup_event():
         print(f"FATAL ERROR (Indexing): {type(e).__name__}: {e}")
     
     print("--- STARTUP: Complete ---")
+    return ready
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The models (and the engine built from them at connect) use this client
+    open_http_client()
+    # Flag to track successful startup, checked by every query
+    app.state.ready = await startup_event()
+    yield
+    await qdrant_service.aclose()
+    await aclose_http_client()
+
+
+app = FastAPI(title="Westeros Legal Assistant", lifespan=lifespan)
+# Not ready until the lifespan has run startup_event
+app.state.ready = False
+
+# Allow CORS during local development so the Next.js frontend can call this API.
+# In production, restrict origins appropriately.
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 @app.get("/query", response_model=Output)
-def query_laws(q: str):
+async def query_laws(q: str):
     """
     Accepts a query string and returns a JSON response serialized 
     from the Pydantic Output class.
     """
-    if not IS_READY:
+    if not app.state.ready:
         raise HTTPException(
             status_code=503, 
             detail="Service is not ready. Data indexing failed during startup. Check Docker logs for 'FATAL ERROR'."
@@ -67,7 +92,7 @@ def query_laws(q: str):
         raise HTTPException(status_code=400, detail="Query string cannot be empty")
     
     try:
-        result = qdrant_service.query(q)
+        result = await qdrant_service.aquery(q)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing error: {str(e)}")
\ No newline at end of file
@@ -1,5 +1,9 @@
 from pydantic import BaseModel
+import httpx
 import qdrant_client
+from app._docparse import assemble_laws, iter_paragraphs
+from app._pdftext import extract_pages_text
+from qdrant_client.http import models as qmodels
 # New LlamaIndex Imports
 from llama_index.vector_stores.qdrant import QdrantVectorStore
 from llama_index.llms.openai import OpenAI
@@ -9,21 +13,97 @@ from llama_index.core import (
     StorageContext,
     ServiceContext,
     Settings,          
-    Document,
 )
 from llama_index.core.query_engine import CitationQueryEngine
+from llama_index.core.schema import MetadataMode, QueryBundle, TextNode
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+import asyncio
+import hashlib
+import json
+import multiprocessing
 import os
-import re
-# from pypdf import PdfReader
-import PyPDF2
+import time
+import uuid
+import numpy as np
+import pypdfium2 as pdfium
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, Iterator
 
 # --- GLOBAL SETTINGS (Modern LlamaIndex) ---
 key=os.environ.get('OPENAI_API_KEY')
-Settings.llm = OpenAI(api_key=key, model="gpt-4")
-Settings.embed_model = OpenAIEmbedding(api_key=key)
+# OpenAI accepts up to 2048 inputs per embeddings request
+EMBED_BATCH_SIZE = 2048
+# text-embedding-3-* can return shortened vectors; 512-d is a third of the
+# default 1536-d size. The Qdrant collection is sized to match.
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIM = 512
+# Points per Qdrant upsert request (QdrantVectorStore defaults to 64)
+UPSERT_BATCH_SIZE = 512
+# Documents pulled from the source, embedded and inserted per step of load()/aload().
+# A multiple of both sizes above: each step sends 4 embedding requests concurrently
+# and then full UPSERT_BATCH_SIZE upserts, while memory stays bounded per step.
+LOAD_BATCH_SIZE = 4 * EMBED_BATCH_SIZE
+# Citation QA is short and extractive; a small deterministic model is enough
+LLM_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+# One pooled HTTP/2 client shared by the async LLM and embedding calls, so
+# concurrent queries reuse warm TLS connections to the OpenAI API. Opened and
+# closed with the app (see open_http_client); None outside of it.
+_shared_http: httpx.AsyncClient | None = None
+
+
+def _configure_models(http_client: httpx.AsyncClient | None) -> None:
+    """Sets the global LLM and embedding model, using `http_client` for async calls."""
+    Settings.llm = OpenAI(
+        api_key=key,
+        model=LLM_MODEL,
+        temperature=0,
+        max_tokens=512,
+        async_http_client=http_client,
+    )
+    Settings.embed_model = OpenAIEmbedding(
+        api_key=key,
+        model=EMBED_MODEL,
+        dimensions=EMBED_DIM,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        async_http_client=http_client,
+    )
+
+
+_configure_models(None)
+
+
+def open_http_client() -> None:
+    """Opens the shared OpenAI HTTP client; call on app startup, before connecting."""
+    global _shared_http
+    if _shared_http is None:
+        _shared_http = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+        )
+        _configure_models(_shared_http)
+
+
+async def aclose_http_client() -> None:
+    """Closes the shared OpenAI HTTP client; call on app shutdown."""
+    global _shared_http
+    if _shared_http is not None:
+        client, _shared_http = _shared_http, None
+        _configure_models(None)
+        await client.aclose()
+
+# Below this many pages, forking a process pool costs more than it saves
+PARALLEL_EXTRACT_MIN_PAGES = 64
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
 
 
 @dataclass
@@ -39,7 +119,8 @@ class Output(BaseModel):
 
 class DocumentService:
     """
-    Service to load the pdf and extract its contents into llama_index Documents.
+    Service to load the pdf and extract its contents into llama_index TextNodes,
+    one per law.
     """
 
     def __init__(self, pdf_path: str | None = None) -> None:
@@ -49,159 +130,268 @@ class DocumentService:
             self.pdf_path = base_dir / "docs" / "laws.pdf"
         else:
             self.pdf_path = Path(pdf_path)
+        # Parse output written at image build time (see scripts/prebuild_docs.py)
+        self.prebuilt_path = self.pdf_path.with_suffix(".jsonl")
+        self._pdf_bytes: bytes | None = None
+
+    def _read_pdf_bytes(self) -> bytes:
+        """Read the PDF from disk once; fingerprinting and extraction share the bytes."""
+        if self._pdf_bytes is None:
+            with self.pdf_path.open("rb", buffering=0) as f:
+                if hasattr(os, "posix_fadvise"):
+                    # single sequential pass, usually on a cold page cache: ask for readahead
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                self._pdf_bytes = f.read()
+        return self._pdf_bytes
+
+    def fingerprint(self) -> str:
+        """sha256 of the PDF, used to tell whether a persisted index is stale."""
+        return hashlib.sha256(self._read_pdf_bytes()).hexdigest()
     
     def _extract_raw_text(self) -> str:
-        """Extract text from the PDF using pypdf (or PyPDF2)."""
-        import pypdf  # or PyPDF2 if that's what you installed
-
-        raw_text_parts: list[str] = []
-        with self.pdf_path.open("rb") as f:
-            reader = pypdf.PdfReader(f)
-            for page in reader.pages:
-                page_text = page.extract_text() or ""
-                raw_text_parts.append(page_text)
-        return "\n".join(raw_text_parts)
-
-    def _normalize_lines(self, raw_text: str) -> List[str]:
-       
-        raw_lines = [ln.strip() for ln in raw_text.splitlines()]
-        paragraphs: List[str] = []
-        buffer: List[str] = []
-
-        def flush_buffer():
-            if buffer:
-                paragraphs.append(" ".join(buffer).strip())
-                buffer.clear()
-
-        # heuristic: lines that clearly start a new bullet / section
-        new_block_re = re.compile(r"^\d+(\.\d+)*\.$")  # e.g. "10.", "10.1.", "10.1.1."
-        for ln in raw_lines:
-            if not ln:
-                flush_buffer()
-                continue
-
-            if new_block_re.match(ln):
-                # standalone subsection marker like "10.1."
-                flush_buffer()
-                paragraphs.append(ln)
-            else:
-                buffer.append(ln)
-
-        flush_buffer()
-        return paragraphs
+        """Extract text from the PDF using pypdfium2 (PDFium, much faster than pypdf).
+
+        Large PDFs are split into page ranges and extracted in parallel processes.
+        """
+        pdf_bytes = self._read_pdf_bytes()
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        n_pages = len(pdf)
+        pdf.close()
+
+        workers = min(os.cpu_count() or 1, n_pages // PARALLEL_EXTRACT_MIN_PAGES)
+        if workers < 2:
+            return extract_pages_text(pdf_bytes, range(n_pages))
+
+        step = -(-n_pages // workers)  # ceil division
+        chunks = [range(i, min(i + step, n_pages)) for i in range(0, n_pages, step)]
+        # Forking here would copy the running event loop and threads (HTTP, Qdrant)
+        # into the children, which can deadlock them; start clean workers instead
+        mp_context = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as ex:
+            texts = ex.map(partial(extract_pages_text, pdf_bytes), chunks)
+            return "\n".join(texts)
+
+    def create_documents(self) -> Iterator[TextNode]:
+        """Yield one TextNode per law, from the prebuilt parse output if it was
+        built from this exact PDF, otherwise by parsing the PDF."""
+        if self._prebuilt_is_fresh():
+            yield from self._load_prebuilt()
+        else:
+            yield from self.parse_documents()
 
-    def create_documents(self) -> List[Document]:
+    def parse_documents(self) -> Iterator[TextNode]:
+        """Parse the PDF, yielding one TextNode per law as soon as it has been read."""
         raw_text = self._extract_raw_text()
-        paragraphs = self._normalize_lines(raw_text)
-
-        # law id and name:
-        #   "10."  -> law id
-        #   "Watch" -> law name
-        law_id_re = re.compile(r"^(\d+)\.\s*$")
-        subsection_re = re.compile(r"^(\d+(?:\.\d+)+\.)\s*(.*)$")
-
-        laws: List[Tuple[str, str, List[str]]] = []  # (law_id, law_name, paras)
-        current_law_id: str | None = None
-        current_law_name: str | None = None
-        current_paras: List[str] = []
-        expecting_name = False
-
-        def flush_law():
-            if current_law_id and current_law_name and current_paras:
-                laws.append((current_law_id, current_law_name, current_paras.copy()))
-
-        for para in paragraphs:
-            m_id = law_id_re.match(para)
-            if m_id:
-                flush_law()
-                current_law_id = m_id.group(1)
-                current_law_name = None
-                current_paras = []
-                expecting_name = True
-                continue
-
-            if expecting_name:
-                name = para.strip()
-                if name:
-                    current_law_name = name
-                    expecting_name = False
-                continue
-
-            if current_law_id is not None:
-                current_paras.append(para)
-
-        flush_law()
-
-        docs: List[Document] = []
-        for law_id, law_name, law_paras in laws:
-            formatted_lines: List[str] = []
-
-            for para in law_paras:
-                # subsection marker on its own line (from _normalize_lines)
-                m_sub = subsection_re.match(para)
-                if m_sub:
-                    number = m_sub.group(1).rstrip(".")
-                    rest = m_sub.group(2).strip()
-
-                    depth = number.count(".") + 1
-                    indent = "  " * (depth - 1)
-                    if rest:
-                        formatted_lines.append(f"{indent}{number}. {rest}")
-                    else:
-                        formatted_lines.append(f"{indent}{number}.")
-                    continue
-
-                # paragraph that begins with a subsection number and text
-                m_inline = subsection_re.match(para)
-                if m_inline:
-                    number = m_inline.group(1).rstrip(".")
-                    rest = m_inline.group(2).strip()
-                    depth = number.count(".") + 1
-                    indent = "  " * (depth - 1)
-                    formatted_lines.append(f"{indent}{number}. {rest}")
-                else:
-                    if not formatted_lines:
-                        formatted_lines.append(para)
-                    else:
-                        formatted_lines[-1] = formatted_lines[-1] + " " + para
-
-            text = " ".join(formatted_lines).strip()
-            metadata = {
-                "LawId": law_id,
-                "LawName": law_name,
-                "Section": f"Law {law_id} – {law_name}",
-            }
-
-            docs.append(
-                Document(
-                    metadata=metadata,
-                    text=text,
-                )
-            )
+        for law_id, law_name, text in assemble_laws(iter_paragraphs(raw_text)):
+            yield self._build_node(law_id, law_name, text)
+
+    def write_prebuilt(self) -> int:
+        """Parse the PDF and write the nodes to `prebuilt_path` as JSON lines,
+        after a header line with the PDF's fingerprint and the node count.
+        Returns the node count."""
+        records = [
+            {"id_": node.node_id, "text": node.text, "metadata": node.metadata}
+            for node in self.parse_documents()
+        ]
+        header = {"source_sha256": self.fingerprint(), "count": len(records)}
+
+        # Write next to the target and swap it in, so an interrupted write never
+        # leaves a partial file at `prebuilt_path`
+        tmp_path = self.prebuilt_path.with_suffix(".jsonl.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.prebuilt_path)
+        return len(records)
+
+    def _prebuilt_is_fresh(self) -> bool:
+        """True if the prebuilt file was written from this PDF and is complete."""
+        try:
+            with self.prebuilt_path.open(encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                count = sum(1 for line in f if line.strip())
+        except (OSError, ValueError):
+            return False
+        return (
+            header.get("source_sha256") == self.fingerprint()
+            and header.get("count") == count
+        )
+
+    def _load_prebuilt(self) -> Iterator[TextNode]:
+        with self.prebuilt_path.open(encoding="utf-8") as f:
+            next(f)  # header
+            for line in f:
+                if line.strip():
+                    yield TextNode(**json.loads(line))
+
+    def _build_node(self, law_id: str, law_name: str, text: str) -> TextNode:
+        metadata = {
+            "LawId": law_id,
+            "LawName": law_name,
+            "Section": f"Law {law_id} – {law_name}",
+        }
+
+        # Already one chunk per law, so these go into the index as-is. The id is
+        # stable across runs (Qdrant point ids must be UUIDs or ints), so
+        # re-indexing overwrites points instead of duplicating them.
+        return TextNode(
+            id_=str(uuid.uuid5(uuid.NAMESPACE_URL, f"westeros-laws/law-{law_id}")),
+            metadata=metadata,
+            text=text,
+        )
 
-        return docs
 
 
+@dataclass
+class _CacheEntry:
+    output: Output
+    slot: int
+    created: float
+
+
+class QueryCache:
+    """
+    Two-layer cache of query Outputs: an exact match on the normalized query
+    string, then the most similar cached query embedding (cosine similarity).
+    Entries are evicted least-recently-used and expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0, threshold: float = 0.95) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        # Row i of _vectors holds the L2-normalized embedding of _slot_keys[i].
+        # Free rows are all zeros, so they never clear the similarity threshold.
+        self._vectors: np.ndarray | None = None
+        self._slot_keys: list[str | None] = [None] * maxsize
+        self._free_slots = list(range(maxsize - 1, -1, -1))
+
+    @staticmethod
+    def normalize(query_str: str) -> str:
+        return " ".join(query_str.lower().split())
+
+    def get(self, key: str) -> Output | None:
+        """Exact lookup on a normalized query string."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.output
+
+    def get_similar(self, embedding: list[float]) -> Output | None:
+        """Lookup of the closest cached query by embedding."""
+        if self._vectors is None or not self._entries:
+            return None
+        sims = self._vectors @ self._unit(embedding)
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        return self.get(self._slot_keys[best])
+
+    def put(self, key: str, embedding: list[float], output: Output) -> None:
+        if key in self._entries:
+            self._evict(key)
+        elif len(self._entries) >= self.maxsize:
+            self._evict(next(iter(self._entries)))
+
+        vector = self._unit(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+        slot = self._free_slots.pop()
+        self._vectors[slot] = vector
+        self._slot_keys[slot] = key
+        self._entries[key] = _CacheEntry(output=output, slot=slot, created=time.monotonic())
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._vectors[entry.slot] = 0.0
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
+
+    @staticmethod
+    def _unit(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
 
 class QdrantService:
     def __init__(self, k: int = 2):
         self.index = None
         self.k = k
         self.collection_name = 'westeros_laws'
+        self.client = None
+        self._aclient = None
+        self._engine = None
+        self._cache = QueryCache()
+        # Local Qdrant storage; also holds the fingerprint of what was indexed.
+        base_dir = Path(__file__).resolve().parent.parent
+        self.storage_path = Path(os.environ.get("QDRANT_PATH", base_dir / "qdrant_storage"))
     
     def connect(self) -> None:
-        """Initializes the Qdrant Client and creates the empty VectorStoreIndex."""
+        """Initializes the Qdrant Client and creates the (possibly empty) VectorStoreIndex."""
         # Allow using an external Qdrant container via QDRANT_URL env var.
-        # If QDRANT_URL is not set, fall back to in-memory client (useful for tests).
+        # If QDRANT_URL is not set, fall back to on-disk local storage at QDRANT_PATH
+        # so the index survives restarts (QDRANT_PATH=:memory: is useful for tests).
         qdrant_url = os.environ.get("QDRANT_URL")
         if qdrant_url:
             # Example: http://qdrant:6333
-            client = qdrant_client.QdrantClient(url=qdrant_url)
+            self.client = qdrant_client.QdrantClient(url=qdrant_url)
+            # Async client so queries don't block the event loop on network I/O
+            self._aclient = qdrant_client.AsyncQdrantClient(url=qdrant_url)
         else:
-            client = qdrant_client.QdrantClient(location=":memory:")
-
-        # Initialize the QdrantVectorStore
-        vstore = QdrantVectorStore(client=client, collection_name=self.collection_name)
+            # A local client can't be shared with an async one (data isn't synced),
+            # so local mode stays sync-only.
+            if str(self.storage_path) == ":memory:":
+                self.client = qdrant_client.QdrantClient(location=":memory:")
+            else:
+                self.client = qdrant_client.QdrantClient(path=str(self.storage_path))
+            self._aclient = None
+
+        self._build_index()
+
+    async def aconnect(self) -> None:
+        """Runs `connect` in a worker thread; opening the client and probing the
+        collection are blocking calls."""
+        await asyncio.to_thread(self.connect)
+
+    async def aclose(self) -> None:
+        """Closes the Qdrant clients, releasing the local storage lock so a later
+        `connect` in the same process can reopen it."""
+        if self._aclient is not None:
+            await self._aclient.close()
+            self._aclient = None
+        if self.client is not None:
+            await asyncio.to_thread(self.client.close)
+            self.client = None
+        self._engine = None
+
+    def _build_index(self) -> None:
+        # Initialize the QdrantVectorStore. The configs only apply when it creates
+        # the collection: HNSW for sub-linear search, and int8 scalar quantization
+        # kept in RAM (4x smaller than float32) with full vectors for rescoring.
+        vstore = QdrantVectorStore(
+            client=self.client,
+            aclient=self._aclient,
+            collection_name=self.collection_name,
+            batch_size=UPSERT_BATCH_SIZE,
+            dense_config=qmodels.VectorParams(
+                size=EMBED_DIM,
+                distance=qmodels.Distance.COSINE,
+                hnsw_config=qmodels.HnswConfigDiff(m=16, ef_construct=128),
+            ),
+            quantization_config=qmodels.ScalarQuantization(
+                scalar=qmodels.ScalarQuantizationConfig(
+                    type=qmodels.ScalarType.INT8,
+                    always_ram=True,
+                ),
+            ),
+        )
         
         # Initialize StorageContext (used for index creation)
         storage_context = StorageContext.from_defaults(vector_store=vstore)
@@ -213,40 +403,140 @@ class QdrantService:
             storage_context=storage_context # Use storage_context with modern core
         )
 
-    def load(self, docs=list[Document]):
-        """Inserts documents into the initialized index."""
+        # Build the query engine once; it only depends on the index and k.
+        self._engine = CitationQueryEngine.from_args(
+            self.index,
+            similarity_top_k=self.k,
+            citation_chunk_size=256,
+        )
+
+    def is_populated(self) -> bool:
+        """True if the collection exists and already holds vectors."""
+        if not self.client.collection_exists(self.collection_name):
+            return False
+        return self.client.count(self.collection_name).count > 0
+
+    def is_fresh(self, fingerprint: str) -> bool:
+        """True if the collection is populated from the source with this fingerprint."""
+        path = self._fingerprint_file()
+        if path is None or not path.exists() or not self.is_populated():
+            return False
+        return path.read_text().strip() == self._index_key(fingerprint)
+
+    def mark_fresh(self, fingerprint: str) -> None:
+        """Records the fingerprint of the source that was just indexed."""
+        path = self._fingerprint_file()
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self._index_key(fingerprint))
+
+    def reset(self) -> None:
+        """Drops the collection so it can be rebuilt without duplicate points."""
+        if self.client.collection_exists(self.collection_name):
+            self.client.delete_collection(self.collection_name)
+        self._build_index()
+
+    def _index_key(self, fingerprint: str) -> str:
+        # Vectors from a different embedding model/size must not be reused either
+        return f"{fingerprint} {EMBED_MODEL}/{EMBED_DIM}"
+
+    def _fingerprint_file(self) -> Path | None:
+        if str(self.storage_path) == ":memory:":
+            return None
+        return self.storage_path / f"{self.collection_name}.sha256"
+
+    def load(self, docs: Iterable[TextNode]) -> int:
+        """Inserts documents into the initialized index. Returns the number inserted."""
         if not self.index:
             raise ValueError("Qdrant Index not connected. Call connect() first.")
         
         # Insert nodes into the index. This populates the Qdrant collection.
-        # This will use the default chunking/embedding logic defined in Settings.
-        # for doc in docs:
-        #    self.index.insert(doc)
-        self.index.insert_nodes(docs)
+        # Nodes are inserted as-is (no re-chunking); embeddings use Settings.embed_model.
+        count = 0
+        for batch in _batched(docs, LOAD_BATCH_SIZE):
+            self.index.insert_nodes(batch)
+            count += len(batch)
+        return count
+
+    async def aload(self, docs: Iterable[TextNode]) -> int:
+        """Embeds documents batch by batch, then inserts them into the index.
+        Returns the number inserted."""
+        if not self.index:
+            raise ValueError("Qdrant Index not connected. Call connect() first.")
+
+        # Consume `docs` LOAD_BATCH_SIZE at a time so a streamed source is never
+        # held in memory all at once.
+        count = 0
+        for batch in _batched(docs, LOAD_BATCH_SIZE):
+            # Split into EMBED_BATCH_SIZE requests that are awaited concurrently
+            texts = [doc.get_content(metadata_mode=MetadataMode.EMBED) for doc in batch]
+            embeddings = await Settings.embed_model.aget_text_embedding_batch(texts)
+            for doc, embedding in zip(batch, embeddings):
+                doc.embedding = embedding
+
+            # Nodes that already carry an embedding skip the index's own embed step;
+            # they reach Qdrant as one upsert per UPSERT_BATCH_SIZE points.
+            self.index.insert_nodes(batch)
+            count += len(batch)
+        return count
     
     def query(self, query_str: str) -> Output:
         if not self.index:
             raise ValueError("Index not initialized. The startup process failed.")
 
-        # Create the CitationQueryEngine
-        query_engine = CitationQueryEngine.from_args(
-            self.index,
-            similarity_top_k=self.k,
-            citation_chunk_size=512,
-        )
+        key = QueryCache.normalize(query_str)
+        cached = self._cache.get(key)
+        if cached is None:
+            embedding = Settings.embed_model.get_query_embedding(query_str)
+            cached = self._cache.get_similar(embedding)
+        if cached is not None:
+            return cached.model_copy(update={"query": query_str})
+
+        # Reuse the embedding from the cache check so retrieval doesn't embed again
+        query_bundle = QueryBundle(query_str, embedding=embedding)
+        response_obj = self._engine.query(query_bundle)
+        output = self._to_output(query_str, response_obj)
+        self._cache.put(key, embedding, output)
+        return output
+
+    async def aquery(self, query_str: str) -> Output:
+        """Async variant of `query` used by the API endpoint."""
+        if not self.index:
+            raise ValueError("Index not initialized. The startup process failed.")
 
-        response_obj = query_engine.query(query_str)
-        
-        # Extract Citations from source nodes
-        citations_list = []
-        for node in response_obj.source_nodes:
-            source_label = node.metadata.get("Section", "Unknown Law")
-            citations_list.append(
-                Citation(
-                    source=source_label,
-                    text=node.get_content().strip()
-                )
+        key = QueryCache.normalize(query_str)
+        cached = self._cache.get(key)
+        if cached is None:
+            embedding = await Settings.embed_model.aget_query_embedding(query_str)
+            cached = self._cache.get_similar(embedding)
+        if cached is not None:
+            return cached.model_copy(update={"query": query_str})
+
+        # Reuse the embedding from the cache check so retrieval doesn't embed again
+        query_bundle = QueryBundle(query_str, embedding=embedding)
+        if self._aclient is not None:
+            response_obj = await self._engine.aquery(query_bundle)
+        else:
+            # Without an async Qdrant client, run the (local, blocking) vector
+            # search in a worker thread and only synthesize on the loop.
+            nodes = await asyncio.to_thread(self._engine.retrieve, query_bundle)
+            response_obj = await self._engine.asynthesize(query_bundle, nodes)
+
+        output = self._to_output(query_str, response_obj)
+        self._cache.put(key, embedding, output)
+        return output
+
+    def _to_output(self, query_str: str, response_obj) -> Output:
+        # Extract Citations from source nodes. get_content() is just the node text
+        # here: metadata is only prepended for the embed/LLM metadata modes.
+        citations_list = [
+            Citation(
+                source=node.metadata.get("Section", "Unknown Law"),
+                text=node.get_content().strip(),
             )
+            for node in response_obj.source_nodes
+        ]
 
         output = Output(
             query=query_str, 
@@ -0,0 +1,27 @@
+"""
+Parse docs/laws.pdf once and write the sections to docs/laws.jsonl.
+
+Run at image build time (see Dockerfile) so the server loads the parsed
+sections instead of re-parsing the PDF on every cold start. The output
+records the PDF's sha256 and the section count; if the PDF changes or the
+file is incomplete, the server ignores it and parses the PDF again.
+
+Usage: python scripts/prebuild_docs.py
+"""
+import sys
+from pathlib import Path
+
+# allow running as a plain script from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils import DocumentService
+
+
+def main() -> None:
+    doc_service = DocumentService()
+    n_docs = doc_service.write_prebuilt()
+    print(f"Wrote {n_docs} sections to {doc_service.prebuilt_path}")
+
+
+if __name__ == "__main__":
+    main()